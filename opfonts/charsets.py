@@ -2,7 +2,12 @@
 
 from __future__ import annotations
 
+import json
 import logging
+import mmap
+import os
+import re
+import shutil
 import zipfile
 from pathlib import Path
 from urllib.request import Request, urlopen
@@ -11,6 +16,7 @@ log = logging.getLogger(__name__)
 
 UNIHAN_URL = "https://www.unicode.org/Public/UCD/latest/ucd/Unihan.zip"
 UNIHAN_MAPPINGS_FILE = "Unihan_OtherMappings.txt"
+UNIHAN_PARSED_FILE = "unihan_parsed.json"
 
 # Unihan fields that identify common-use CJK ideographs per locale.
 # We take the UNION of all three to build one unified charset.
@@ -20,6 +26,17 @@ LOCALE_FIELDS = {
     "kJis0":    "JP (JIS X 0208)",
 }
 
+# Non-empty, non-comment line of a charset file, without its line ending.
+# Lines may end in LF, CRLF or a bare CR, as with universal-newline reading.
+_CHARSET_LINE_RE = re.compile(rb"(?:^|(?<=\r))[^#\r\n][^\r\n]*", re.M)
+
+# One Unihan record per line: "U+4E00<TAB>kGB0<TAB>5027". Only the fields in
+# LOCALE_FIELDS match, so comments and unrelated fields are skipped by the scan.
+_UNIHAN_RE = re.compile(
+    rb"^U\+([0-9A-F]+)\t(" + b"|".join(f.encode() for f in LOCALE_FIELDS) + rb")\t(\S+)",
+    re.M,
+)
+
 
 def load_charset_file(path: Path) -> list[int]:
     """Read a charset file → sorted codepoint list.
@@ -29,19 +46,20 @@ def load_charset_file(path: Path) -> list[int]:
     - Hex: one hex codepoint per line (e.g. 4E00)
     """
     codepoints: set[int] = set()
-    with open(path, encoding="utf-8") as f:
-        for line in f:
-            line = line.rstrip("\n")
-            if not line or line.startswith("#"):
-                continue
-            if len(line) == 1:
-                codepoints.add(ord(line))
-            else:
-                try:
-                    codepoints.add(int(line, 16))
-                except ValueError:
-                    # Multi-char line that isn't hex — take first char
-                    codepoints.add(ord(line[0]))
+    with open(path, "rb") as f:
+        if not os.fstat(f.fileno()).st_size:
+            return []
+        # Scan the mapped bytes directly; only non-hex lines are ever decoded.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in _CHARSET_LINE_RE.findall(mm):
+                if len(line) > 1:
+                    try:
+                        codepoints.add(int(line, 16))
+                        continue
+                    except ValueError:
+                        pass
+                # Single character, or multi-char line that isn't hex — take first char
+                codepoints.add(ord(line.decode("utf-8")[0]))
     log.debug("Loaded %d codepoints from %s", len(codepoints), path)
     return sorted(codepoints)
 
@@ -49,13 +67,12 @@ def load_charset_file(path: Path) -> list[int]:
 def save_charset_file(path: Path, codepoints: set[int], header: str = "") -> None:
     """Write codepoints to a charset file (one hex codepoint per line)."""
     path.parent.mkdir(parents=True, exist_ok=True)
+    lines = [f"# {line}" for line in header.splitlines()]
+    if lines:
+        lines.append("")
+    lines.extend(f"{cp:04X}" for cp in sorted(codepoints))
     with open(path, "w") as f:
-        if header:
-            for line in header.splitlines():
-                f.write(f"# {line}\n")
-            f.write("\n")
-        for cp in sorted(codepoints):
-            f.write(f"{cp:04X}\n")
+        f.write("".join(f"{line}\n" for line in lines))
     log.info("Wrote %d codepoints to %s", len(codepoints), path)
 
 
@@ -65,8 +82,7 @@ def generate_charsets(output_dir: Path, cache_dir: Path) -> dict[str, Path]:
     The unified charset is the UNION of common characters across SC, TC, and JP.
     Returns dict of charset name → file path.
     """
-    unihan_data = _download_unihan(cache_dir)
-    per_locale = _parse_unihan_mappings(unihan_data)
+    per_locale = _load_unihan_locales(cache_dir)
 
     # Build unified set
     unified: set[int] = set()
@@ -89,49 +105,74 @@ def generate_charsets(output_dir: Path, cache_dir: Path) -> dict[str, Path]:
     return {"cjk_unified": out_path}
 
 
-def _download_unihan(cache_dir: Path) -> str:
-    """Download Unihan.zip and extract Unihan_OtherMappings.txt content."""
+def _download_unihan(cache_dir: Path) -> Path:
+    """Download Unihan.zip into the cache dir if missing and return its path."""
     zip_path = cache_dir / "Unihan.zip"
     cache_dir.mkdir(parents=True, exist_ok=True)
 
     if not zip_path.exists():
         log.info("Downloading Unihan database from %s", UNIHAN_URL)
         req = Request(UNIHAN_URL, headers={"User-Agent": "opfonts/0.1"})
-        with urlopen(req, timeout=120) as resp:
-            zip_path.write_bytes(resp.read())
+        # Stream to disk rather than buffering the whole archive in memory;
+        # the .part rename keeps an interrupted download out of the cache.
+        part_path = zip_path.with_suffix(".zip.part")
+        with urlopen(req, timeout=120) as resp, open(part_path, "wb") as f:
+            shutil.copyfileobj(resp, f, 1 << 20)
+        os.replace(part_path, zip_path)
         log.info("Saved %s (%.1f KB)", zip_path, zip_path.stat().st_size / 1024)
 
+    return zip_path
+
+
+def _load_unihan_locales(cache_dir: Path) -> dict[str, set[int]]:
+    """Return per-locale codepoint sets from Unihan.
+
+    The parsed result is cached next to Unihan.zip and keyed on the zip's
+    mtime and size, so repeat runs skip the parse until the zip changes.
+    """
+    zip_path = _download_unihan(cache_dir)
+    st = zip_path.stat()
+    sig = [st.st_mtime_ns, st.st_size]
+
+    parsed_path = cache_dir / UNIHAN_PARSED_FILE
+    if parsed_path.exists():
+        try:
+            cached = json.loads(parsed_path.read_text())
+        except (OSError, ValueError):
+            cached = {}
+        fields = cached.get("fields", {})
+        if cached.get("sig") == sig and fields.keys() == LOCALE_FIELDS.keys():
+            log.debug("Using parsed Unihan cache: %s", parsed_path)
+            return {f: set(cps) for f, cps in fields.items()}
+
     with zipfile.ZipFile(zip_path) as zf:
-        with zf.open(UNIHAN_MAPPINGS_FILE) as f:
-            return f.read().decode("utf-8")
+        per_locale = _parse_unihan_mappings(zf.read(UNIHAN_MAPPINGS_FILE))
 
+    parsed_path.write_text(json.dumps({
+        "sig": sig,
+        "fields": {f: sorted(cps) for f, cps in per_locale.items()},
+    }))
+    log.debug("Wrote parsed Unihan cache: %s", parsed_path)
+    return per_locale
 
-def _parse_unihan_mappings(data: str) -> dict[str, set[int]]:
+
+def _parse_unihan_mappings(data: bytes) -> dict[str, set[int]]:
     """Parse Unihan_OtherMappings.txt → {field_name: set of codepoints}."""
-    fields_we_want = set(LOCALE_FIELDS.keys())
-    result: dict[str, set[int]] = {f: set() for f in fields_we_want}
-
-    for line in data.splitlines():
-        if not line or line.startswith("#"):
-            continue
-        parts = line.split("\t")
-        if len(parts) < 3:
-            continue
-        cp_str, field, value = parts[0], parts[1], parts[2]
-        if field not in fields_we_want:
-            continue
-        cp = int(cp_str[2:], 16)
+    result: dict[str, set[int]] = {f: set() for f in LOCALE_FIELDS}
+
+    for m in _UNIHAN_RE.finditer(data):
+        cp_hex, field, value = m.groups()
+        field = field.decode("ascii")
 
         # Filter Big5 to Level 1 only (常用字, A440-C67E)
         if field == "kBigFive":
-            hex_part = value.strip()[:4]
             try:
-                big5_code = int(hex_part, 16)
+                big5_code = int(value[:4], 16)
             except ValueError:
                 continue
             if big5_code < 0xA440 or big5_code > 0xC67E:
                 continue
 
-        result[field].add(cp)
+        result[field].add(int(cp_hex, 16))
 
     return result
@@ -3,11 +3,17 @@
 from __future__ import annotations
 
 import logging
+import os
+import shutil
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
 from pathlib import Path
 from urllib.error import HTTPError, URLError
-from urllib.parse import quote
-from urllib.request import Request, urlopen
+from urllib.parse import quote, urljoin, urlsplit, urlunsplit
+from urllib.request import Request, getproxies, urlopen
 
 from .config import BuildConfig
 
@@ -16,21 +22,130 @@ log = logging.getLogger(__name__)
 _USER_AGENT = "opfonts/0.1"
 _MAX_RETRIES = 3
 _RETRY_DELAY = 2.0  # seconds
+_TIMEOUT = 60  # seconds
+_CHUNK_SIZE = 1 << 16
+_MAX_REDIRECTS = 5
+_REDIRECT_CODES = (301, 302, 303, 307, 308)
 
+# Idle keep-alive connections per (scheme, netloc), shared by all download
+# threads for the life of the process. http.client connections are not
+# thread-safe, so each one is checked out for a single request at a time.
+_idle: dict[tuple[str, str], list[HTTPConnection]] = {}
+_idle_lock = threading.Lock()
 
-def _download(url: str, dest: Path) -> None:
-    """Download url to dest with retries."""
-    log.info("Downloading %s", url)
-    req = Request(url, headers={"User-Agent": _USER_AGENT})
-    for attempt in range(1, _MAX_RETRIES + 1):
+
+def _request(key: tuple[str, str], target: str, headers: dict[str, str]):
+    """Send a GET on an idle pooled connection, or a new one if none is idle.
+
+    A reused connection may have been closed by the server while idle; that
+    request is retried on the next connection. Returns (response, connection).
+    """
+    while True:
+        with _idle_lock:
+            idle = _idle.get(key)
+            conn = idle.pop() if idle else None
+        reused = conn is not None
+        if conn is None:
+            conn_cls = HTTPSConnection if key[0] == "https" else HTTPConnection
+            conn = conn_cls(key[1], timeout=_TIMEOUT)
+        try:
+            conn.request("GET", target, headers=headers)
+            return conn.getresponse(), conn
+        except (HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+
+
+def _release(key: tuple[str, str], conn: HTTPConnection, resp) -> None:
+    """Return conn to the idle pool if resp was read to the end, else close it."""
+    if resp.isclosed() and not resp.will_close:
+        with _idle_lock:
+            _idle.setdefault(key, []).append(conn)
+    else:
+        conn.close()
+
+
+@contextmanager
+def _open(url: str, headers: dict[str, str] | None = None):
+    """GET url and yield the response, reusing kept-alive connections per host.
+
+    Most fonts come from the same host, so this saves a TCP+TLS handshake
+    per file. Proxied requests and non-HTTP schemes go through urlopen.
+    The connection goes back to the pool only if the body was read to the end.
+    A 304 answer to a conditional request is yielded, not raised.
+    """
+    headers = {"User-Agent": _USER_AGENT, **(headers or {})}
+    for _ in range(_MAX_REDIRECTS + 1):
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or parts.scheme in getproxies():
+            req = Request(url, headers=headers)
+            try:
+                resp = urlopen(req, timeout=_TIMEOUT)
+            except HTTPError as exc:
+                if exc.code != 304:
+                    raise
+                resp = exc
+            with resp:
+                yield resp
+            return
+
+        key = (parts.scheme, parts.netloc)
+        target = urlunsplit(("", "", parts.path or "/", parts.query, ""))
+        resp, conn = _request(key, target, headers)
+        if resp.status in _REDIRECT_CODES:
+            resp.read()
+            _release(key, conn, resp)
+            url = urljoin(url, resp.getheader("Location", ""))
+            continue
+        if resp.status not in (200, 304):
+            resp.read()
+            _release(key, conn, resp)
+            raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+        if resp.status == 304:
+            resp.read()  # no body; marks the response done so conn can be reused
+        try:
+            yield resp
+        finally:
+            _release(key, conn, resp)
+        return
+    raise URLError(f"Too many redirects for {url}")
+
+
+def _download(url: str, dest: Path, etag: str | None = None) -> None:
+    """Download url to dest with retries.
+
+    With an ``etag`` the cached dest is revalidated instead: a single
+    conditional GET, where 304 keeps the file and a failure falls back to it.
+    """
+    log.info("Revalidating %s" if etag else "Downloading %s", url)
+    headers = {"If-None-Match": etag} if etag else None
+    attempts = 1 if etag else _MAX_RETRIES
+    # Stream to a .part file and rename it into place, so the font is never
+    # held in memory whole and a failed fetch never looks cached.
+    part = dest.with_suffix(dest.suffix + ".part")
+    for attempt in range(1, attempts + 1):
         try:
-            with urlopen(req, timeout=60) as resp:
-                data = resp.read()
             dest.parent.mkdir(parents=True, exist_ok=True)
-            dest.write_bytes(data)
-            log.debug("Saved %s (%d bytes)", dest, len(data))
+            with _open(url, headers) as resp:
+                if resp.status == 304:
+                    log.debug("Not modified: %s", dest)
+                    return
+                with open(part, "wb") as f:
+                    shutil.copyfileobj(resp, f, _CHUNK_SIZE)
+                new_etag = resp.headers.get("ETag")
+            os.replace(part, dest)
+            if new_etag:
+                _etag_path(dest).write_text(new_etag)
+            else:
+                _etag_path(dest).unlink(missing_ok=True)
+            log.debug("Saved %s (%d bytes)", dest, dest.stat().st_size)
             return
-        except (HTTPError, URLError, OSError) as exc:
+        except (HTTPError, URLError, HTTPException, OSError) as exc:
+            part.unlink(missing_ok=True)
+            if etag:
+                log.warning("Could not revalidate %s, using cached copy: %s", dest.name, exc)
+                return
             if attempt == _MAX_RETRIES:
                 raise RuntimeError(f"Failed to download {url} after {_MAX_RETRIES} attempts") from exc
             log.warning("Attempt %d/%d failed for %s: %s", attempt, _MAX_RETRIES, url, exc)
@@ -41,16 +156,53 @@ def _cache_path(cache_dir: Path, font_name: str) -> Path:
     return cache_dir / font_name
 
 
+def _etag_path(cached: Path) -> Path:
+    return cached.with_suffix(cached.suffix + ".etag")
+
+
 def ensure_font(cache_dir: Path, font_name: str, url: str) -> Path:
     """Return local path to a font, downloading if needed."""
     cached = _cache_path(cache_dir, font_name)
-    if cached.exists():
-        log.debug("Cache hit: %s", cached)
-        return cached
-    _download(url, cached)
+    download_all([(font_name, url, cached)])
     return cached
 
 
+def download_all(plan: list[tuple[str, str, Path]], max_workers: int = 8) -> list[Path]:
+    """Fetch every uncached entry of a (name, url, cache_path) plan concurrently.
+
+    Downloads are I/O-bound, so they run on a thread pool. The first failure
+    is raised as soon as it happens; queued downloads are cancelled and those
+    already running finish in the background. Cached fonts with a stored ETag are
+    revalidated with a conditional GET. Returns the cache paths in plan order.
+    """
+    fetch: dict[Path, tuple[str, str | None]] = {}
+    for _, url, cached in plan:
+        if cached in fetch:
+            continue  # scripts may share a source font
+        if not cached.exists():
+            fetch[cached] = (url, None)
+        elif _etag_path(cached).exists():
+            fetch[cached] = (url, _etag_path(cached).read_text().strip())
+        else:
+            log.debug("Cache hit: %s", cached)
+
+    if fetch:
+        pool = ThreadPoolExecutor(max_workers=min(max_workers, len(fetch)))
+        futures = [
+            pool.submit(_download, url, dest, etag) for dest, (url, etag) in fetch.items()
+        ]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            # Don't wait for the downloads still running, which may be retrying
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+    return [cached for _, _, cached in plan]
+
+
 def get_download_plan(config: BuildConfig) -> list[tuple[str, str, Path]]:
     """Return (name, url, cache_path) tuples for all fonts that would be downloaded."""
     plan: list[tuple[str, str, Path]] = []
@@ -3,53 +3,129 @@
 from __future__ import annotations
 
 import logging
+import os
 import shutil
+from collections import Counter
+from functools import partial
+from multiprocessing import parent_process
 from pathlib import Path
 
+from fontTools.fontBuilder import FontBuilder
 from fontTools.merge import Merger
+from fontTools.pens.cu2quPen import Cu2QuPointPen
+from fontTools.pens.t2CharStringPen import T2CharStringPen
+from fontTools.pens.ttGlyphPen import TTGlyphPointPen
 from fontTools.ttLib import TTFont
+from fontTools.ttLib.scaleUpem import scale_upem
+from fontTools.ttLib.sfnt import SFNTReader
+from fontTools.ttLib.tables import G_S_U_B_
+from fontTools.ttLib.tables._c_m_a_p import cmap_format_12
+from fontTools.ttLib.tables.otTables import GSUB as GSUBTable
+
+from .workers import process_pool
 
 log = logging.getLogger(__name__)
 
 _TTF_GLYPH_LIMIT = 65535
+# Below this many glyphs, worker start-up costs more than drawing serially.
+_PARALLEL_MIN_GLYPHS = 4096
+_CID_TOP_KEYS = (
+    "ROS", "CIDFontVersion", "CIDFontRevision", "CIDFontType", "CIDCount",
+    "UIDBase", "FDArray", "FDSelect",
+)
+
+
+def _draw_charstrings(font: TTFont, glyph_names: list[str]) -> dict[str, object]:
+    """Draw glyphs through T2CharStringPen into CFF charstrings."""
+    glyph_set = font.getGlyphSet()
+    metrics = font["hmtx"].metrics
+    # fontTools >= 4.38 BasePen.qCurveTo auto-decomposes to curveTo,
+    # so TTF quadratic outlines are converted to cubic losslessly.
+    sources = [(gname, glyph_set[gname], metrics[gname][0]) for gname in glyph_names]
+    charstrings: dict[str, object] = {}
+    for gname, glyph, width in sources:
+        pen = T2CharStringPen(width, glyphSet=glyph_set)
+        glyph.draw(pen)
+        charstrings[gname] = pen.getCharString()
+    return charstrings
+
+
+def _draw_quadratic(font: TTFont, glyph_names: list[str]) -> dict[str, object]:
+    """Convert glyphs cubic → quadratic into glyf Glyph objects."""
+    glyph_set = font.getGlyphSet()
+    sources = [(gname, glyph_set[gname]) for gname in glyph_names]
+    glyphs: dict[str, object] = {}
+    for gname, glyph in sources:
+        pen = TTGlyphPointPen(None)
+        cu2qu_pen = Cu2QuPointPen(pen, max_err=1.0, reverse_direction=True)
+        glyph.drawPoints(cu2qu_pen)
+        glyphs[gname] = pen.glyph()
+    return glyphs
+
+
+def _draw_shard(draw, font_path: Path, glyph_names: list[str]) -> dict[str, object]:
+    """Worker entry point: reopen the font and draw one shard of glyphs."""
+    font = TTFont(font_path, lazy=True)
+    try:
+        return draw(font, glyph_names)
+    finally:
+        font.close()
+
+
+def _draw_glyphs(draw, font: TTFont, font_path: Path, glyph_order: list[str]) -> dict[str, object]:
+    """Run a glyph drawing function, sharded across processes for large fonts.
+
+    Workers reopen ``font_path``, so only fonts still backed by that file
+    (not rebuilt in memory) are sharded. Inside a merge-prep worker the
+    cores are already busy with other fonts, so drawing stays serial.
+    """
+    workers = os.cpu_count() or 1
+    if (
+        workers == 1
+        or parent_process() is not None
+        or font.reader is None
+        or len(glyph_order) < _PARALLEL_MIN_GLYPHS
+    ):
+        return draw(font, glyph_order)
+
+    size = -(-len(glyph_order) // workers)
+    shards = [glyph_order[i:i + size] for i in range(0, len(glyph_order), size)]
+    glyphs: dict[str, object] = {}
+    with process_pool(len(shards)) as pool:
+        for part in pool.map(partial(_draw_shard, draw, font_path), shards):
+            glyphs.update(part)
+    return glyphs
 
 
 def _is_cff(font_path: Path) -> bool:
-    """Check if a font has CFF outlines."""
-    font = TTFont(font_path)
-    result = "CFF " in font or "CFF2" in font
+    """Check if a font file has CFF outlines (reads only the table directory)."""
+    with open(font_path, "rb") as f:
+        tables = SFNTReader(f).tables
+    return "CFF " in tables or "CFF2" in tables
+
+
+def _read_upm(font_path: Path) -> int:
+    """Read unitsPerEm without loading anything beyond the head table."""
+    font = TTFont(font_path, lazy=True)
+    upm = font["head"].unitsPerEm
     font.close()
-    return result
+    return upm
 
 
-def _ensure_cff(font_path: Path) -> Path:
+def _ensure_cff(font: TTFont, font_path: Path) -> TTFont:
     """If font has glyf outlines (TTF), convert to CFF. Quadratic→cubic is lossless."""
-    font = TTFont(font_path)
     if "CFF " in font or "CFF2" in font:
-        font.close()
-        return font_path
+        return font
 
     log.info("Converting glyf → CFF: %s", font_path.name)
 
-    from fontTools.fontBuilder import FontBuilder
-    from fontTools.pens.t2CharStringPen import T2CharStringPen
-
     upm = font["head"].unitsPerEm
     glyph_order = font.getGlyphOrder()
-    glyph_set = font.getGlyphSet()
     cmap = dict(font.getBestCmap() or {})
-    hmtx = font["hmtx"]
-    metrics = {gname: hmtx[gname] for gname in glyph_order}
+    metrics = dict(font["hmtx"].metrics)
 
     # Build CFF charstrings by drawing each glyph through T2Pen.
-    # fontTools >= 4.38 BasePen.qCurveTo auto-decomposes to curveTo,
-    # so TTF quadratic outlines are converted to cubic losslessly.
-    charstrings: dict[str, object] = {}
-    for gname in glyph_order:
-        width = hmtx[gname][0]
-        pen = T2CharStringPen(width, glyphSet=glyph_set)
-        glyph_set[gname].draw(pen)
-        charstrings[gname] = pen.getCharString()
+    charstrings = _draw_glyphs(_draw_charstrings, font, font_path, glyph_order)
 
     fb = FontBuilder(upm, isTTF=False)
     fb.setupGlyphOrder(glyph_order)
@@ -75,43 +151,28 @@ def _ensure_cff(font_path: Path) -> Path:
         if tag in font:
             new_font[tag] = font[tag]
 
-    out_path = font_path.with_suffix(".cff.otf")
-    new_font.save(str(out_path))
     font.close()
 
-    log.info("glyf→CFF done: %s (%d glyphs)", out_path.name, len(glyph_order))
-    return out_path
+    log.info("glyf→CFF done: %s (%d glyphs)", font_path.name, len(glyph_order))
+    return new_font
 
 
-def _ensure_quadratic(font_path: Path) -> Path:
+def _ensure_quadratic(font: TTFont, font_path: Path) -> TTFont:
     """If font has CFF outlines (OTF), convert to quadratic TrueType outlines."""
-    font = TTFont(font_path)
     if "CFF " not in font and "CFF2" not in font:
-        font.close()
-        return font_path
+        return font
 
     log.info("Converting CFF → quadratic: %s", font_path.name)
 
-    from fontTools.pens.cu2quPen import Cu2QuPointPen
-    from fontTools.pens.ttGlyphPen import TTGlyphPointPen
-    from fontTools.fontBuilder import FontBuilder
-
     upm = font["head"].unitsPerEm
     glyph_order = font.getGlyphOrder()
-    glyph_set = font.getGlyphSet()
     cmap = dict(font.getBestCmap() or {})
 
     # Convert each glyph: cubic → quadratic via pen protocol
-    glyphs = {}
-    for gname in glyph_order:
-        pen = TTGlyphPointPen(None)
-        cu2qu_pen = Cu2QuPointPen(pen, max_err=1.0, reverse_direction=True)
-        glyph_set[gname].drawPoints(cu2qu_pen)
-        glyphs[gname] = pen.glyph()
+    glyphs = _draw_glyphs(_draw_quadratic, font, font_path, glyph_order)
 
     # Collect horizontal metrics
-    hmtx = font["hmtx"]
-    metrics = {gname: hmtx[gname] for gname in glyph_order}
+    metrics = dict(font["hmtx"].metrics)
 
     # Build new TTF via FontBuilder
     fb = FontBuilder(upm, isTTF=True)
@@ -133,140 +194,125 @@ def _ensure_quadratic(font_path: Path) -> Path:
         if tag in font:
             new_font[tag] = font[tag]
 
-    out_path = font_path.with_suffix(".conv.ttf")
-    new_font.save(str(out_path))
     font.close()
 
-    log.info("CFF→TTF done: %s (%d glyphs)", out_path.name, len(glyph_order))
-    return out_path
+    log.info("CFF→TTF done: %s (%d glyphs)", font_path.name, len(glyph_order))
+    return new_font
 
 
-def _decid_cff(font_path: Path) -> Path:
+def _rebase_width(cs, private) -> None:
+    """Re-encode a charstring's advance width against another Private dict.
+
+    The width is an optional extra operand before the first stack-clearing
+    operator, detected by argument parity (implicit vstems before a hintmask
+    come in pairs, so they never look like a width).
+    """
+    program = list(cs.program)
+    width = cs.private.defaultWidthX
+    for n_args, token in enumerate(program):
+        if isinstance(token, str):
+            if n_args and (n_args % 2) ^ (token in ("hmoveto", "vmoveto")):
+                width = program.pop(0) + cs.private.nominalWidthX
+            break
+    if width != private.defaultWidthX:
+        program.insert(0, width - private.nominalWidthX)
+    cs.program = program
+
+
+def _decid_cff(font: TTFont, font_path: Path) -> TTFont:
     """Convert CID-keyed CFF to name-keyed CFF (required for fontTools merger).
 
-    Rebuilds the font from scratch via T2CharStringPen to ensure clean name-keyed output.
+    Charstring programs are kept as-is: the CID keys are dropped from the top
+    dict and every glyph shares the first FD's Private dict, with advance
+    widths re-encoded where another FD used different width defaults.
     """
-    font = TTFont(font_path)
     if "CFF " not in font:
-        font.close()
-        return font_path
+        return font
 
     cff = font["CFF "].cff
     top_dict = cff.topDictIndex[0]
     if not hasattr(top_dict, "ROS"):
-        font.close()
-        return font_path
+        return font
 
     log.info("Converting CID-keyed → name-keyed CFF: %s", font_path.name)
 
-    from fontTools.fontBuilder import FontBuilder
-    from fontTools.pens.t2CharStringPen import T2CharStringPen
-
-    upm = font["head"].unitsPerEm
-    glyph_order = font.getGlyphOrder()
-    glyph_set = font.getGlyphSet()
-    cmap = dict(font.getBestCmap() or {})
-    hmtx = font["hmtx"]
-    metrics = {gname: hmtx[gname] for gname in glyph_order}
-
-    charstrings: dict[str, object] = {}
-    for gname in glyph_order:
-        width = hmtx[gname][0]
-        pen = T2CharStringPen(width, glyphSet=glyph_set)
-        glyph_set[gname].draw(pen)
-        charstrings[gname] = pen.getCharString()
-
-    fb = FontBuilder(upm, isTTF=False)
-    fb.setupGlyphOrder(glyph_order)
-    fb.setupCharacterMap(cmap)
-    fb.setupCFF(
-        psName=font_path.stem,
-        fontInfo={},
-        charStringsDict=charstrings,
-        privateDict={},
-    )
-    fb.setupHorizontalMetrics(metrics)
-    fb.setupHorizontalHeader(
-        ascent=font["hhea"].ascent,
-        descent=font["hhea"].descent,
-    )
-    fb.setupNameTable({"familyName": font_path.stem, "styleName": "Regular"})
-    fb.setupOS2()
-    fb.setupPost()
-
-    new_font = fb.font
-    for tag in ("GSUB", "GPOS", "GDEF"):
-        if tag in font:
-            new_font[tag] = font[tag]
-
-    out_path = font_path.with_suffix(".nk.otf")
-    new_font.save(str(out_path))
-    font.close()
-
-    log.info("CID→name-keyed done: %s (%d glyphs)", out_path.name, len(glyph_order))
-    return out_path
-
-
-def _strip_tables(font_path: Path, table_tags: list[str]) -> None:
-    """Remove specified tables from a font file in-place."""
-    font = TTFont(font_path)
-    changed = False
+    # Local Subrs belong to a single FD and cannot be shared
+    cff.desubroutinize()
+    fd_array = top_dict.FDArray
+    private = fd_array[0].Private
+    widths = (private.nominalWidthX, private.defaultWidthX)
+    charstrings = top_dict.CharStrings
+    for cs in charstrings.values():
+        if (cs.private.nominalWidthX, cs.private.defaultWidthX) != widths:
+            _rebase_width(cs, private)
+        cs.private = private
+    index = getattr(charstrings, "charStringsIndex", None)
+    for obj in (charstrings, index):
+        if obj is not None:
+            vars(obj).pop("fdArray", None)
+            vars(obj).pop("fdSelect", None)
+    if index is not None:
+        index.private = private
+
+    if hasattr(fd_array[0], "FontMatrix"):
+        top_dict.FontMatrix = fd_array[0].FontMatrix
+    for key in _CID_TOP_KEYS:
+        top_dict.rawDict.pop(key, None)
+        vars(top_dict).pop(key, None)
+    top_dict.Private = private
+
+    log.info("CID→name-keyed done: %s (%d glyphs)", font_path.name, len(charstrings))
+    return font
+
+
+def _strip_tables(font: TTFont, table_tags: list[str]) -> None:
+    """Remove specified tables from a font in-place.
+
+    On a lazily opened font this only drops directory entries; the tables
+    are never decompiled and the rest are copied through as raw bytes on save.
+    """
     for tag in table_tags:
         if tag in font:
             del font[tag]
-            changed = True
-    if changed:
-        font.save(str(font_path))
-    font.close()
 
 
-def _normalize_upm(font_path: Path, target_upm: int) -> Path:
+def _normalize_upm(font: TTFont, font_path: Path, target_upm: int) -> None:
     """Scale font to target UPM if different."""
-    font = TTFont(font_path)
     current_upm = font["head"].unitsPerEm
     if current_upm == target_upm:
-        font.close()
-        return font_path
+        return
 
     log.info("Scaling %s UPM %d → %d", font_path.name, current_upm, target_upm)
-    from fontTools.ttLib.scaleUpem import scale_upem
     scale_upem(font, target_upm)
-    out_path = font_path.with_suffix(".scaled.otf")
-    font.save(str(out_path))
-    font.close()
-    return out_path
 
 
-def _ensure_gsub(font_path: Path) -> None:
-    """Ensure the font has a GSUB table (add empty one if missing)."""
-    font = TTFont(font_path)
-    if "GSUB" not in font:
-        log.debug("Adding empty GSUB to %s", font_path.name)
-        from fontTools.ttLib.tables import G_S_U_B_
-        from fontTools.ttLib.tables.otTables import GSUB as GSUBTable
-
-        gsub = G_S_U_B_.table_G_S_U_B_()
-        gsub_table = GSUBTable()
-        gsub_table.Version = 0x00010000
-        gsub_table.ScriptList = None
-        gsub_table.FeatureList = None
-        gsub_table.LookupList = None
-        gsub.table = gsub_table
-        font["GSUB"] = gsub
-        font.save(str(font_path))
-    font.close()
+def _ensure_gsub(font: TTFont, font_path: Path) -> None:
+    """Ensure the font has a GSUB table (add empty one if missing).
+
+    The presence check is a table-directory lookup on the lazy font, so
+    fonts that already have GSUB return without decompiling anything.
+    """
+    if "GSUB" in font:
+        return
+
+    log.debug("Adding empty GSUB to %s", font_path.name)
+
+    gsub = G_S_U_B_.table_G_S_U_B_()
+    gsub_table = GSUBTable()
+    gsub_table.Version = 0x00010000
+    gsub_table.ScriptList = None
+    gsub_table.FeatureList = None
+    gsub_table.LookupList = None
+    gsub.table = gsub_table
+    font["GSUB"] = gsub
 
 
 def _rebuild_cmap(font: TTFont) -> None:
     """Rebuild cmap using format 12 to avoid format 4 overflow with large glyph sets."""
-    from fontTools.ttLib.tables._c_m_a_p import cmap_format_12
-
     cmap = font["cmap"]
-    # Collect all mappings from existing subtables
-    all_mappings: dict[int, str] = {}
-    for table in cmap.tables:
-        if hasattr(table, "cmap") and table.cmap:
-            all_mappings.update(table.cmap)
+    # The merger only emits Unicode subtables, and the best one (3,10 when
+    # present) already covers the others — no need to union them all.
+    all_mappings: dict[int, str] = font.getBestCmap() or {}
 
     fmt12 = cmap_format_12(12)
     fmt12.platEncID = 10
@@ -281,6 +327,36 @@ def _rebuild_cmap(font: TTFont) -> None:
     log.info("Rebuilt cmap: %d mappings", len(all_mappings))
 
 
+def _prepare_font(
+    font_path: Path,
+    use_cff: bool,
+    target_upm: int,
+    drop_tables: list[str] | None,
+) -> Path:
+    """Open a font once, run every merge-prep stage on it and write it once.
+
+    Returns the path of the prepared font, ready for the merger.
+    """
+    font = TTFont(font_path, lazy=True, recalcBBoxes=False, recalcTimestamp=False)
+    # Strip first: dropped tables are then never decompiled, copied or scaled
+    if drop_tables:
+        _strip_tables(font, drop_tables)
+    font = _decid_cff(font, font_path)
+    font = _ensure_cff(font, font_path) if use_cff else _ensure_quadratic(font, font_path)
+    _normalize_upm(font, font_path, target_upm)
+    if not drop_tables or "GSUB" not in drop_tables:
+        _ensure_gsub(font, font_path)
+
+    # Intermediate file (rebuilt fonts included): the merged save recomputes
+    # bounds and timestamp
+    font.recalcBBoxes = False
+    font.recalcTimestamp = False
+    out_path = font_path.with_suffix(".prep.otf" if use_cff else ".prep.ttf")
+    font.save(str(out_path))
+    font.close()
+    return out_path
+
+
 def merge_fonts(
     font_paths: list[Path],
     output_path: Path,
@@ -290,7 +366,8 @@ def merge_fonts(
 
     Auto-detects outline format: if majority are CFF, converts outliers
     to CFF and outputs OTF. Otherwise converts to TTF.
-    The first font in the list defines baseline metrics.
+    The first font in the list defines baseline metrics. Inputs are scaled
+    to the most common UPM (ties go to the first font).
     """
     if not font_paths:
         raise ValueError("No fonts to merge")
@@ -301,25 +378,25 @@ def merge_fonts(
         return output_path
 
     # Determine dominant outline format
-    cff_count = sum(1 for p in font_paths if _is_cff(p))
+    cff_flags = [_is_cff(p) for p in font_paths]
+    cff_count = sum(cff_flags)
     use_cff = cff_count > len(font_paths) // 2
-    convert_fn = _ensure_cff if use_cff else _ensure_quadratic
     fmt_name = "CFF" if use_cff else "TTF"
     log.info("Outline format: %s (%d/%d CFF inputs)", fmt_name, cff_count, len(font_paths))
 
-    f = TTFont(font_paths[0])
-    target_upm = f["head"].unitsPerEm
-    f.close()
-
-    processed: list[Path] = []
-    for p in font_paths:
-        converted = _decid_cff(p)
-        converted = convert_fn(converted)
-        converted = _normalize_upm(converted, target_upm)
-        _ensure_gsub(converted)
-        if drop_tables:
-            _strip_tables(converted, drop_tables)
-        processed.append(converted)
+    # Only the minority UPM fonts go through the expensive scale_upem pass
+    target_upm = Counter(_read_upm(p) for p in font_paths).most_common(1)[0][0]
+
+    # Inputs are independent, so each is prepared in its own process. With at
+    # most one outline conversion, prep stays in-process instead so that the
+    # one expensive conversion can shard its glyphs across the cores.
+    prepare = partial(_prepare_font, use_cff=use_cff, target_upm=target_upm, drop_tables=drop_tables)
+    conversions = sum(1 for is_cff in cff_flags if is_cff != use_cff)
+    if conversions > 1:
+        with process_pool(min(len(font_paths), os.cpu_count() or 1)) as pool:
+            processed = list(pool.map(prepare, font_paths))
+    else:
+        processed = [prepare(p) for p in font_paths]
 
     log.info("Merging %d fonts (base: %s, UPM: %d)", len(processed), processed[0].name, target_upm)
 
@@ -3,23 +3,27 @@
 from __future__ import annotations
 
 import logging
-from pathlib import Path
 
 from fontTools.ttLib import TTFont
+from fontTools.ttLib.tables._n_a_m_e import makeName
 
 log = logging.getLogger(__name__)
 
+_NAME_PLATFORMS = (
+    (3, 1, 0x0409),  # Windows, Unicode BMP, English
+    (1, 0, 0),       # Mac, Roman, English
+)
 
-def rename_font(
-    font_path: Path,
+
+def set_font_names(
+    font: TTFont,
     family_name: str,
     style_name: str,
     version: str = "1.000",
     copyright: str = "",
     designer: str = "",
 ) -> None:
-    """Rewrite the name table to use the given family/style names."""
-    font = TTFont(font_path)
+    """Rewrite the name table of an open font to use the given family/style names."""
     name_table = font["name"]
 
     full_name = f"{family_name}-{style_name}"
@@ -41,11 +45,15 @@ def rename_font(
     if designer:
         entries[9] = designer
 
-    for name_id, value in entries.items():
-        name_table.setName(value, name_id, 3, 1, 0x0409)  # Windows, Unicode BMP, English
-        name_table.setName(value, name_id, 1, 0, 0)        # Mac, Roman, English
-
-    font.save(str(font_path))
-    font.close()
-
-    log.info("Renamed font: %s → %s %s", font_path.name, family_name, style_name)
+    # Rebuild the record list in one pass rather than a linear setName() scan
+    # per entry. Every record for a rewritten ID is replaced, including
+    # localized names inherited from the source fonts.
+    kept = [rec for rec in name_table.names if rec.nameID not in entries]
+    records = [
+        makeName(value, name_id, plat, enc, lang)
+        for name_id, value in entries.items()
+        for plat, enc, lang in _NAME_PLATFORMS
+    ]
+    name_table.names = kept + records
+
+    log.info("Set font names: %s %s", family_name, style_name)
@@ -2,25 +2,37 @@
 
 from __future__ import annotations
 
-import copy
 import logging
+import os
 import shutil
 import tempfile
+from dataclasses import replace
+from functools import partial
 from pathlib import Path
 
+from fontTools.subset import Options, Subsetter
+from fontTools.ttLib import TTFont
+
 from .charsets import load_charset_file
-from .config import BuildConfig
-from .download import ensure_font, get_download_plan
+from .config import BuildConfig, ScriptEntry
+from .download import download_all, get_download_plan
 from .merge import merge_fonts
-from .naming import rename_font
+from .naming import set_font_names
 from .subset import parse_unicode_ranges, subset_font
+from .workers import process_pool
+
+try:
+    import cffsubr
+    _HAS_CFFSUBR = True
+except ImportError:
+    _HAS_CFFSUBR = False
 
 log = logging.getLogger(__name__)
 
 
 
-def _resolve_codepoints(script, config: BuildConfig) -> list[int]:
-    """Resolve the full codepoint list for a script entry.
+def _resolve_codepoints(script, config: BuildConfig) -> set[int]:
+    """Resolve the full codepoint set for a script entry.
 
     If charset_file is set, load codepoints from it and merge with unicode_ranges
     (so CJK ideographs come from the charset, but punctuation/fullwidth ranges
@@ -38,10 +50,9 @@ def _resolve_codepoints(script, config: BuildConfig) -> list[int]:
         )
         # Merge with unicode_ranges (for punctuation, fullwidth, etc.)
         if script.unicode_ranges:
-            range_cps = set(parse_unicode_ranges(script.unicode_ranges))
-            charset_cps |= range_cps
-        return sorted(charset_cps)
-    return parse_unicode_ranges(script.unicode_ranges)
+            charset_cps.update(parse_unicode_ranges(script.unicode_ranges))
+        return charset_cps
+    return set(parse_unicode_ranges(script.unicode_ranges))
 
 
 def dry_run(config: BuildConfig) -> None:
@@ -78,53 +89,59 @@ def build(config: BuildConfig) -> Path:
 
     # 1. Download
     log.info("Step 1/5: Downloading fonts...")
-    font_paths: dict[str, Path] = {}
-    for script in enabled:
-        font_paths[script.name] = ensure_font(config.cache_dir, script.font, script.url)
+    paths = download_all(get_download_plan(config))
+    font_paths: dict[str, Path] = {s.name: p for s, p in zip(enabled, paths)}
 
     # 2. Subset (dedup: later scripts only get codepoints not already covered)
+    # Dedup is resolved up front in script order from each source cmap, so the
+    # CPU-bound subsetting itself can run in parallel processes.
     log.info("Step 2/5: Subsetting fonts...")
     work_dir = Path(tempfile.mkdtemp(prefix="opfonts_"))
     try:
-        subset_entries: list[tuple[Path, bool]] = []  # (path, should_scale)
+        jobs: list[tuple[Path, list[int], Path, bool, str]] = []  # (src, codepoints, out, should_scale, name)
         covered_cps: set[int] = set()
 
         for script in enabled:
             src = font_paths[script.name]
             out = work_dir / f"subset_{script.name}.otf"
-            codepoints = _resolve_codepoints(script, config)
-            if covered_cps:
-                codepoints = [cp for cp in codepoints if cp not in covered_cps]
+            codepoints = _resolve_codepoints(script, config) - covered_cps
             if not codepoints:
                 log.info("Skipping %s: all codepoints already covered", script.name)
                 continue
-            try:
-                subset_font(src, codepoints=codepoints, output_path=out)
-                # Track actual cmap (font may not have all requested codepoints)
-                from fontTools.ttLib import TTFont
-                font = TTFont(out)
-                covered_cps.update(font.getBestCmap().keys())
-                font.close()
-                subset_entries.append((out, script.scale))
-            except ValueError as exc:
-                log.warning("Skipping %s: %s", script.name, exc)
-
-        if not subset_entries:
+            # Track actual cmap (font may not have all requested codepoints)
+            present = _read_cmap(src) & codepoints
+            if not present:
+                log.warning("Skipping %s: no matching glyphs in %s", script.name, src.name)
+                continue
+            covered_cps |= present
+            jobs.append((src, sorted(codepoints), out, script.scale, script.name))
+
+        if not jobs:
             raise RuntimeError("All subsets were empty — nothing to merge")
 
         # Scale each subset to match target cap-height ratio.
-        # If not set, auto-detect from first script (base font).
-        subset_paths = [p for p, _ in subset_entries]
+        # If not set, auto-detect from first script (base font). Subsetting
+        # leaves OS/2 and head untouched, so the source font's ratio is used.
         target_ratio = config.metrics.target_cap_ratio
         if target_ratio <= 0:
-            target_ratio = _get_cap_ratio(subset_paths[0])
+            target_ratio = _get_cap_ratio(jobs[0][0])
         if target_ratio > 0:
             log.info("Target cap ratio: %.3f", target_ratio)
-            for sp, should_scale in subset_entries:
-                if should_scale:
-                    _scale_to_target(sp, target_ratio)
-                else:
-                    log.info("Skipping scale for %s (scale = false)", sp.name)
+
+        # Scaling runs inside each subset job on the in-memory font, so every
+        # subset is written exactly once.
+        with process_pool(min(len(jobs), os.cpu_count() or 1)) as pool:
+            futures = []
+            for src, codepoints, out, should_scale, name in jobs:
+                transform = None
+                if target_ratio > 0 and should_scale:
+                    transform = partial(_scale_to_target, target_cap_ratio=target_ratio, label=name)
+                elif target_ratio > 0:
+                    log.info("Skipping scale for %s (scale = false)", name)
+                futures.append(pool.submit(
+                    subset_font, src, codepoints=codepoints, output_path=out, transform=transform,
+                ))
+            subset_paths = [future.result() for future in futures]
 
         # 3. Merge
         log.info("Step 3/5: Merging %d subset fonts...", len(subset_paths))
@@ -133,30 +150,38 @@ def build(config: BuildConfig) -> Path:
         output_path = out_dir / config.output
         merge_fonts(subset_paths, output_path, drop_tables=config.merge.drop_tables)
 
+        # 4-5 operate on one in-memory font, saved once at the end
+        merged_size = output_path.stat().st_size
+        font = TTFont(output_path)
+
         # 4. Prune unused GSUB/GPOS features and unreferenced glyphs
         if config.merge.keep_features:
-            _prune_features(output_path, config.merge.keep_features)
+            _prune_features(font, config.merge.keep_features)
 
         # 5. Rename, fix metrics & subroutinize
         log.info("Step 5/5: Setting font metadata...")
-        rename_font(output_path, config.name, config.style, copyright=config.copyright, designer=config.designer)
-        _fix_metrics(output_path, config.metrics)
-        _subroutinize(output_path)
+        set_font_names(font, config.name, config.style, copyright=config.copyright, designer=config.designer)
+        _fix_metrics(font, config.metrics)
+        _subroutinize(font)
+        glyph_count = len(font.getGlyphOrder())
+        font.save(str(output_path))
+        font.close()
     finally:
         shutil.rmtree(work_dir, ignore_errors=True)
 
     final_size = output_path.stat().st_size
     log.info(
-        "Done! %s — %.1f KB (%d glyphs)",
+        "Done! %s — %.1f KB → %.1f KB (%d glyphs)",
         output_path,
+        merged_size / 1024,
         final_size / 1024,
-        _count_glyphs(output_path),
+        glyph_count,
     )
     return output_path
 
 
 
-def _prune_features(font_path: Path, keep_features: list[str]) -> None:
+def _prune_features(font: TTFont, keep_features: list[str]) -> None:
     """Remove GSUB/GPOS features not in keep list, then prune unreferenced glyphs.
 
     Uses fontTools subsetter to re-subset the merged font, keeping only the
@@ -164,10 +189,6 @@ def _prune_features(font_path: Path, keep_features: list[str]) -> None:
     drops alternate glyphs (stylistic sets, CJK variants, etc.) that aren't
     needed for a car UI.
     """
-    from fontTools.ttLib import TTFont
-    from fontTools.subset import Subsetter, Options
-
-    font = TTFont(font_path)
     cmap = font.getBestCmap()
     before_glyphs = len(font.getGlyphOrder())
 
@@ -183,8 +204,6 @@ def _prune_features(font_path: Path, keep_features: list[str]) -> None:
     subsetter.subset(font)
 
     after_glyphs = len(font.getGlyphOrder())
-    font.save(str(font_path))
-    font.close()
 
     log.info(
         "Step 4/5: Pruned features → kept %s, glyphs %d → %d (removed %d)",
@@ -192,9 +211,16 @@ def _prune_features(font_path: Path, keep_features: list[str]) -> None:
     )
 
 
+def _read_cmap(font_path: Path) -> set[int]:
+    """Return the set of codepoints mapped by a font's best cmap."""
+    font = TTFont(font_path, lazy=True)
+    cmap = set(font.getBestCmap() or {})
+    font.close()
+    return cmap
+
+
 def _get_cap_ratio(font_path: Path) -> float:
     """Read a font's cap-height / UPM ratio."""
-    from fontTools.ttLib import TTFont
     font = TTFont(font_path)
     upm = font["head"].unitsPerEm
     cap = font["OS/2"].sCapHeight if font["OS/2"].sCapHeight else 0
@@ -202,71 +228,199 @@ def _get_cap_ratio(font_path: Path) -> float:
     return cap / upm if upm and cap > 0 else 0.0
 
 
-def _scale_to_target(font_path: Path, target_cap_ratio: float) -> None:
+def _scale_to_target(font: TTFont, target_cap_ratio: float, label: str = "") -> None:
     """Scale all glyphs in a font so its cap-height ratio matches the target.
 
     Each source font may have a different cap-height ratio, so this must run
     per-subset *before* merging to get uniform visual size across mixed sources.
     """
-    from fontTools.ttLib import TTFont
-
-    font = TTFont(font_path)
     upm = font["head"].unitsPerEm
     source_cap = font["OS/2"].sCapHeight if font["OS/2"].sCapHeight else 0
     if source_cap <= 0:
-        font.close()
         return
 
     source_ratio = source_cap / upm
     scale = target_cap_ratio / source_ratio
     if abs(scale - 1.0) < 0.001:
-        font.close()
         return
 
-    log.info("Scaling %s by %.3f (cap ratio %.3f → %.3f)", font_path.name, scale, source_ratio, target_cap_ratio)
+    log.info("Scaling %s by %.3f (cap ratio %.3f → %.3f)", label, scale, source_ratio, target_cap_ratio)
 
     if "CFF " in font:
-        from fontTools.pens.t2CharStringPen import T2CharStringPen
-        from fontTools.pens.transformPen import TransformPen
-
-        cff = font["CFF "]
-        td = cff.cff.topDictIndex[0]
-        cs = td.CharStrings
+        cff = font["CFF "].cff
+        td = cff.topDictIndex[0]
         hmtx = font["hmtx"]
 
-        for gname in list(cs.keys()):
-            old_cs = cs[gname]
-            old_cs.decompile()
-            width = hmtx.metrics[gname][0] if gname in hmtx.metrics else 0
-            pen = T2CharStringPen(width=round(width * scale), glyphSet=None)
-            tpen = TransformPen(pen, (scale, 0, 0, scale, 0, 0))
-            old_cs.draw(tpen)
-            new_cs = pen.getCharString()
-            new_cs.private = old_cs.private
-            new_cs.globalSubrs = old_cs.globalSubrs
-            cs[gname] = new_cs
-
-        for gname in hmtx.metrics:
-            width, lsb = hmtx.metrics[gname]
-            hmtx.metrics[gname] = (round(width * scale), round(lsb * scale))
+        # Subr indices are operands too, so inline them before touching numbers.
+        cff.desubroutinize()
+        for cs in td.CharStrings.values():
+            _scale_charstring(cs, scale, cs.private.nominalWidthX)
+
+        privates = [fd.Private for fd in td.FDArray] if hasattr(td, "FDArray") else [td.Private]
+        for private in privates:
+            _scale_private(private, scale)
+
+        hmtx.metrics = {
+            gname: (round(width * scale), round(lsb * scale))
+            for gname, (width, lsb) in hmtx.metrics.items()
+        }
 
     os2 = font["OS/2"]
     os2.sxHeight = round(os2.sxHeight * scale) if os2.sxHeight else 0
     os2.sCapHeight = round(os2.sCapHeight * scale) if os2.sCapHeight else 0
 
-    font.save(str(font_path))
-    font.close()
 
+_HINT_OPS = frozenset(("hstem", "hstemhm", "vstem", "vstemhm", "hintmask", "cntrmask"))
+_WIDTH_OPS = _HINT_OPS | {"hmoveto", "vmoveto", "rmoveto", "endchar"}
+_XY_OPS = frozenset(("rmoveto", "rlineto", "rrcurveto", "rcurveline", "rlinecurve"))
+_X, _Y = 0, 1
 
-def _fix_metrics(font_path: Path, metrics) -> None:
+
+def _operand_axes(op: str, args: list) -> tuple[list, int | None]:
+    """Return the axis of each path operand, plus the axis a flex op closes on.
+
+    An axis of None marks an operand that is not a coordinate (the flex depth).
+    """
+    n = len(args)
+    if op in _XY_OPS:
+        return [i % 2 for i in range(n)], None
+    if op == "hmoveto":
+        return [_X], None
+    if op == "vmoveto":
+        return [_Y], None
+    if op in ("hlineto", "vlineto"):
+        first = _X if op == "hlineto" else _Y
+        return [(first + i) % 2 for i in range(n)], None
+    if op == "hhcurveto":
+        return [_Y] * (n % 2) + [_X, _X, _Y, _X] * (n // 4), None
+    if op == "vvcurveto":
+        return [_X] * (n % 2) + [_Y, _X, _Y, _Y] * (n // 4), None
+    if op in ("hvcurveto", "vhcurveto"):
+        start = 0 if op == "hvcurveto" else 1
+        axes = []
+        for k in range(n // 4):
+            axes += [_X, _X, _Y, _Y] if (k + start) % 2 == 0 else [_Y, _X, _Y, _X]
+        if n % 4:
+            axes.append(_X if (n // 4 - 1 + start) % 2 == 0 else _Y)
+        return axes, None
+    if op == "flex":
+        return [i % 2 for i in range(12)] + [None], None
+    if op == "hflex":
+        return [_X, _X, _Y, _X, _X, _X, _X], _Y
+    if op == "hflex1":
+        return [_X, _Y, _X, _Y, _X, _X, _X, _Y, _X], _Y
+    if op == "flex1":
+        dx, dy = abs(sum(args[0:10:2])), abs(sum(args[1:10:2]))
+        if dx > dy:
+            return [i % 2 for i in range(10)] + [_X], _Y
+        return [i % 2 for i in range(10)] + [_Y], _X
+    return [None] * n, None
+
+
+def _settle_flex1(program: list, closes: int) -> str:
+    """Check a scaled flex1 still closes on the axis the source closed on.
+
+    The renderer picks flex1's closing axis from the larger of |Σdx| and |Σdy|,
+    which rounding can tie or flip. If it no longer matches, the 11 operands at
+    the end of program are rewritten as a full flex with both closing deltas.
+    Returns the operator to emit.
+    """
+    deltas = program[-11:-1]
+    dx, dy = sum(deltas[0::2]), sum(deltas[1::2])
+    if (abs(dx) > abs(dy)) == (closes == _Y):
+        return "flex1"
+    last = program.pop()
+    program.extend((last, -dy) if closes == _Y else (-dx, last))
+    program.append(50)
+    return "flex"
+
+
+def _scale_charstring(cs, scale: float, nominal_width: int) -> None:
+    """Scale a decompiled, desubroutinized T2 charstring in place.
+
+    All outline operands are relative deltas, so a uniform scale can be applied
+    per operand without drawing the glyph through a pen. Each delta is derived
+    from rounded absolute positions so rounding error never accumulates along
+    a contour. Hint mask bytes and seac char codes are copied through as-is.
+    """
+    pos = [0, 0]         # current point, source units
+    scaled_pos = [0, 0]  # current point, rounded target units
+    program: list = []
+    args: list = []
+    seen_width = False
+    tokens = iter(cs.program)
+    for token in tokens:
+        if not isinstance(token, str):
+            args.append(token)
+            continue
+
+        if not seen_width and token in _WIDTH_OPS:
+            seen_width = True
+            if args and (len(args) % 2) ^ (token in ("hmoveto", "vmoveto")):
+                width = args.pop(0) + nominal_width
+                program.append(round(width * scale) - round(nominal_width * scale))
+
+        if token in _HINT_OPS:
+            # Stem edges are chained deltas starting from zero
+            edge = scaled_edge = 0
+            for v in args:
+                edge += v
+                new = round(edge * scale)
+                program.append(new - scaled_edge)
+                scaled_edge = new
+        elif token == "endchar":
+            # seac form: adx ady bchar achar
+            program.extend(round(v * scale) for v in args[:2])
+            program.extend(args[2:])
+        else:
+            axes, closes = _operand_axes(token, args)
+            if closes is not None:
+                start, scaled_start = pos[closes], scaled_pos[closes]
+            for axis, v in zip(axes, args):
+                if axis is None:
+                    program.append(v)
+                    continue
+                pos[axis] += v
+                new = round(pos[axis] * scale)
+                program.append(new - scaled_pos[axis])
+                scaled_pos[axis] = new
+            if closes is not None:
+                pos[closes], scaled_pos[closes] = start, scaled_start
+            if token == "flex1":
+                token = _settle_flex1(program, closes)
+
+        program.append(token)
+        args = []
+        if token in ("hintmask", "cntrmask"):
+            program.append(next(tokens))
+    cs.setProgram(program)
+
+
+_PRIVATE_SCALED_LISTS = ("BlueValues", "OtherBlues", "FamilyBlues", "FamilyOtherBlues", "StemSnapH", "StemSnapV")
+_PRIVATE_SCALED_VALUES = ("BlueShift", "StdHW", "StdVW", "defaultWidthX", "nominalWidthX")
+
+
+def _scale_private(private, scale: float) -> None:
+    """Scale the metric fields of a CFF Private dict to match scaled charstrings.
+
+    Widths are encoded relative to nominalWidthX/defaultWidthX, so these must
+    scale along with the charstring operands.
+    """
+    for key in _PRIVATE_SCALED_LISTS:
+        values = getattr(private, key, None)
+        if values:
+            setattr(private, key, [round(v * scale) for v in values])
+    for key in _PRIVATE_SCALED_VALUES:
+        value = getattr(private, key, None)
+        if value:
+            setattr(private, key, round(value * scale))
+
+
+def _fix_metrics(font: TTFont, metrics) -> None:
     """Set vertical metrics on the merged font. Skips if ascender/descender are 0."""
     if metrics.ascender == 0 and metrics.descender == 0:
         return
 
-    from fontTools.ttLib import TTFont
-
-    font = TTFont(font_path)
-
     ascender = metrics.ascender
     descender = metrics.descender
 
@@ -282,41 +436,20 @@ def _fix_metrics(font_path: Path, metrics) -> None:
     hhea.descent = descender
     hhea.lineGap = 0
 
-    font.save(str(font_path))
-    font.close()
     log.info("Fixed metrics: ascender=%d, descender=%d", ascender, descender)
 
 
 
 
-def _subroutinize(font_path: Path) -> None:
+def _subroutinize(font: TTFont) -> None:
     """Re-subroutinize CFF outlines for smaller file size."""
-    from fontTools.ttLib import TTFont
-    font = TTFont(font_path)
     if "CFF " not in font:
-        font.close()
         return
-    try:
-        import cffsubr
-    except ImportError:
+    if not _HAS_CFFSUBR:
         log.debug("cffsubr not installed, skipping subroutinization")
-        font.close()
         return
-    before = font_path.stat().st_size
     cffsubr.subroutinize(font)
-    font.save(str(font_path))
-    font.close()
-    after = font_path.stat().st_size
-    log.info("Subroutinized: %.1f KB → %.1f KB (%.0f%% smaller)",
-             before / 1024, after / 1024, (before - after) / before * 100)
-
-
-def _count_glyphs(font_path: Path) -> int:
-    from fontTools.ttLib import TTFont
-    font = TTFont(font_path)
-    count = len(font.getGlyphOrder())
-    font.close()
-    return count
+    log.info("Subroutinized CFF outlines")
 
 
 def build_all(config: BuildConfig) -> list[Path]:
@@ -327,18 +460,27 @@ def build_all(config: BuildConfig) -> list[Path]:
     outputs = []
     for weight in config.weights:
         log.info("=== Building weight: %s ===", weight)
-        cfg = copy.deepcopy(config)
-        cfg.style = weight
-        cfg.output = f"{config.name}-{weight}.otf"
-        # Replace weight stem in font filenames/URLs for this weight.
-        # Scripts with explicit weights only swap if the weight is available.
-        for script in cfg.scripts:
-            if not script.weights or weight in script.weights:
-                stem = Path(script.font).stem       # e.g. "IBMPlexSansSC-Regular"
-                ext = Path(script.font).suffix       # e.g. ".otf"
-                base = stem.rsplit("-", 1)[0]         # e.g. "IBMPlexSansSC"
-                new_font = f"{base}-{weight}{ext}"
-                script.url = script.url.replace(script.font, new_font)
-                script.font = new_font
+        # Only style/output and per-script font/url change per weight, so the
+        # rest of the config (merge, metrics, ...) is shared rather than copied.
+        cfg = replace(
+            config,
+            style=weight,
+            output=f"{config.name}-{weight}.otf",
+            scripts=[_script_for_weight(s, weight) for s in config.scripts],
+        )
         outputs.append(build(cfg))
     return outputs
+
+
+def _script_for_weight(script: ScriptEntry, weight: str) -> ScriptEntry:
+    """Replace weight stem in font filename/URL for this weight.
+
+    Scripts with explicit weights only swap if the weight is available.
+    """
+    if script.weights and weight not in script.weights:
+        return script
+    stem = Path(script.font).stem       # e.g. "IBMPlexSansSC-Regular"
+    ext = Path(script.font).suffix       # e.g. ".otf"
+    base = stem.rsplit("-", 1)[0]         # e.g. "IBMPlexSansSC"
+    new_font = f"{base}-{weight}{ext}"
+    return replace(script, font=new_font, url=script.url.replace(script.font, new_font))
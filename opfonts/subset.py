@@ -4,6 +4,9 @@ from __future__ import annotations
 
 import logging
 import tempfile
+from collections.abc import Callable
+from io import BytesIO
+from itertools import chain
 from pathlib import Path
 
 from fontTools.subset import Options, Subsetter
@@ -11,10 +14,13 @@ from fontTools.ttLib import TTFont
 
 log = logging.getLogger(__name__)
 
+# Layout tables are dropped: output is for BMFont rasterization
+_DROP_TABLES = ["meta", "GSUB", "GPOS", "GDEF"]
+
 
 def parse_unicode_ranges(ranges: list[str]) -> list[int]:
     """Parse Unicode range strings like 'U+0600-06FF' into a sorted list of codepoints."""
-    codepoints: set[int] = set()
+    spans: list[tuple[int, int]] = []
     for r in ranges:
         r = r.strip().upper()
         if not r.startswith("U+"):
@@ -22,12 +28,21 @@ def parse_unicode_ranges(ranges: list[str]) -> list[int]:
         r = r[2:]  # strip U+
         if "-" in r:
             start_s, end_s = r.split("-", 1)
-            start = int(start_s, 16)
-            end = int(end_s, 16)
-            codepoints.update(range(start, end + 1))
+            spans.append((int(start_s, 16), int(end_s, 16)))
+        else:
+            cp = int(r, 16)
+            spans.append((cp, cp))
+
+    # Merge overlapping spans so the result comes out sorted and unique
+    # without hashing every codepoint through a set.
+    spans.sort()
+    merged: list[list[int]] = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
         else:
-            codepoints.add(int(r, 16))
-    return sorted(codepoints)
+            merged.append([start, end])
+    return list(chain.from_iterable(range(start, end + 1) for start, end in merged))
 
 
 def subset_font(
@@ -35,9 +50,12 @@ def subset_font(
     unicode_ranges: list[str] | None = None,
     output_path: Path | None = None,
     codepoints: list[int] | None = None,
+    transform: Callable[[TTFont], None] | None = None,
 ) -> Path:
     """Subset a font to only the glyphs covering the given Unicode ranges or codepoints.
 
+    If given, transform is applied to the subset font in memory before it is
+    saved, so post-processing doesn't need to reopen the written file.
     Returns the path to the subset font (a temp file if output_path is None).
     """
     if codepoints is None:
@@ -51,7 +69,7 @@ def subset_font(
 
     # Check how many requested codepoints exist in the font
     cmap = font.getBestCmap() or {}
-    present = [cp for cp in codepoints if cp in cmap]
+    present = len(cmap.keys() & codepoints)
     if not present:
         log.warning(
             "No glyphs found in %s for any of the %d requested codepoints",
@@ -60,23 +78,31 @@ def subset_font(
         font.close()
         raise ValueError(f"No matching glyphs in {font_path.name} for given ranges")
 
-    if len(present) < len(codepoints):
+    if present < len(codepoints):
         log.debug(
             "%s: %d/%d requested codepoints have glyphs",
-            font_path.name, len(present), len(codepoints),
+            font_path.name, present, len(codepoints),
         )
 
-    options = Options()
-    options.layout_features = []  # drop all GSUB/GPOS features (output is for BMFont rasterization)
-    options.name_IDs = ["*"]
-    options.notdef_outline = True
-    options.recalc_bounds = True
-    options.recalc_timestamp = False
-    options.drop_tables = ["meta", "GSUB", "GPOS", "GDEF"]
-
-    subsetter = Subsetter(options=options)
-    subsetter.populate(unicodes=codepoints)
-    subsetter.subset(font)
+    subset_data = _hb_subset(font_path, codepoints)
+    if subset_data is not None:
+        font.close()
+        font = TTFont(BytesIO(subset_data), recalcTimestamp=False)
+    else:
+        options = Options()
+        options.layout_features = []  # drop all GSUB/GPOS features (output is for BMFont rasterization)
+        options.name_IDs = ["*"]
+        options.notdef_outline = True
+        options.recalc_bounds = True
+        options.recalc_timestamp = False
+        options.drop_tables = list(_DROP_TABLES)
+
+        subsetter = Subsetter(options=options)
+        subsetter.populate(unicodes=codepoints)
+        subsetter.subset(font)
+
+    if transform is not None:
+        transform(font)
 
     if output_path is None:
         tmp = tempfile.NamedTemporaryFile(suffix=".ttf", delete=False)
@@ -90,6 +116,28 @@ def subset_font(
     log.info(
         "Subset %s → %s (%d codepoints, %.1f KB)",
         font_path.name, output_path.name,
-        len(present), output_path.stat().st_size / 1024,
+        present, output_path.stat().st_size / 1024,
     )
     return output_path
+
+
+def _hb_subset(font_path: Path, codepoints: list[int]) -> bytes | None:
+    """Subset with HarfBuzz hb-subset, mirroring the fontTools options above.
+
+    Returns the subset font bytes, or None if uharfbuzz isn't installed.
+    """
+    try:
+        import uharfbuzz as hb
+    except ImportError:
+        log.debug("uharfbuzz not installed, using fontTools subsetter")
+        return None
+
+    face = hb.Face(hb.Blob.from_file_path(str(font_path)))
+    inp = hb.SubsetInput()
+    inp.unicode_set.update(codepoints)
+    inp.layout_feature_tag_set.clear()
+    inp.drop_table_tag_set.update(int.from_bytes(tag.encode(), "big") for tag in _DROP_TABLES)
+    inp.name_id_set.clear()
+    inp.name_id_set.invert()  # keep all name IDs
+    inp.flags |= hb.SubsetFlags.NOTDEF_OUTLINE
+    return hb.subset(face, inp).blob.data
@@ -0,0 +1,31 @@
+"""Process pools whose workers log the same way as the parent process."""
+
+from __future__ import annotations
+
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _init_logging(level: int, formatter: logging.Formatter | None) -> None:
+    """Pool initializer: set up root logging like the parent's.
+
+    Forked workers inherit the parent's handlers and are left alone. Spawned
+    and forkserver workers start with no handlers, so without this their
+    records are lost.
+    """
+    root = logging.getLogger()
+    if formatter is None or root.handlers:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(formatter)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+
+def process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """Return a ProcessPoolExecutor whose workers log like this process."""
+    root = logging.getLogger()
+    formatter = (root.handlers[0].formatter or logging.Formatter()) if root.handlers else None
+    return ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_logging, initargs=(root.level, formatter),
+    )